@@ -0,0 +1,21 @@
+import os 
+import sys 
+
+from setuptools import setup
+
+ext_modules = []
+
+# The translator can optionally be compiled to a C extension with mypyc: 
+#   pip install mypy && SHOGIUTIL_USE_MYPYC=1 pip install --no-build-isolation . 
+# Without it the pure Python module is installed as usual. A compiled module 
+# has no code object so 'python -m shogiutil.usiwrapcli' doesn't work, use the 
+# usiwrap script (or call main_cli) instead. 
+# 
+# mypyc extensions only work on CPython. On PyPy install the pure module 
+# instead (pypy3 -m pip install .), the JIT already speeds up the translator 
+# and the usiwrap script will run under PyPy 
+if os.environ.get('SHOGIUTIL_USE_MYPYC', '0') == '1' and sys.implementation.name == 'cpython': 
+    from mypyc.build import mypycify 
+    ext_modules = mypycify(['shogiutil/usiwrapcli.py'])
+
+setup(ext_modules=ext_modules)
@@ -1,343 +1,551 @@
 import argparse
-import collections
+import io
 import os 
+import re
+import select
+import selectors
 import signal
 import subprocess
 import sys 
 import threading
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple
 
 DEBUG = False 
 
-USI_INFO_KEYWORDS = {
-    'depth', 
-    'seldepth', 
-    'time', 
-    'nodes', 
-    'pv', 
-    'multipv', 
-    'score', 
-    'cp', 
-    'mate', 
-    'lowerbound', 
-    'upperbound', 
-    'currmove', 
-    'currmovenumber', 
-    'hashfull', 
-    'nps', 
-    'cpuload', 
-    'string', 
-    'refutation', 
-    'currline' 
-}
-
-USI_INFO_MOVE_KEYWORDS = {
-    'pv', 
-    'currmove', 
-    'refutation', 
-    'currline'
-}
+# Converters take one protocol line (or word) and return its translation 
+Converter = Callable[[bytes], bytes]
+
+# Pipe buffer size, engines can print a lot of info lines quickly 
+BUFFER_SIZE = 1 << 16
+
+# Number of converted moves to remember. There are only about 13.5k distinct 
+# moves so in practice only junk tokens can fill it 
+MOVE_CACHE_SIZE = 1 << 16
+
+USI_INFO_KEYWORDS = frozenset({
+    b'depth', 
+    b'seldepth', 
+    b'time', 
+    b'nodes', 
+    b'pv', 
+    b'multipv', 
+    b'score', 
+    b'cp', 
+    b'mate', 
+    b'lowerbound', 
+    b'upperbound', 
+    b'currmove', 
+    b'currmovenumber', 
+    b'hashfull', 
+    b'nps', 
+    b'cpuload', 
+    b'string', 
+    b'refutation', 
+    b'currline' 
+})
+
+USI_INFO_MOVE_KEYWORDS = frozenset({
+    b'pv', 
+    b'currmove', 
+    b'refutation', 
+    b'currline'
+})
 
 USI_TO_UCI_OPTIONS = {
-    'USI_Hash': 'Hash', 
-    'USI_Variant': 'UCI_Variant'
+    b'USI_Hash': b'Hash', 
+    b'USI_Variant': b'UCI_Variant'
 }
 
 UCI_TO_USI_OPTIONS = {
-    'Hash': 'USI_Hash', 
-    'UCI_Variant': 'USI_Variant'
+    b'Hash': b'USI_Hash', 
+    b'UCI_Variant': b'USI_Variant'
 }
 
-HAND_ORDER = [
+# Info lines always start with 'info' so keywords are preceded by a space 
+USI_INFO_KEYWORD_RE = re.compile(
+    rb' (' + b'|'.join(sorted(USI_INFO_KEYWORDS)) + rb')(?= |$)'
+)
+
+# Finds the first move list, or 'string' which ends the line 
+USI_INFO_MOVE_START_RE = re.compile(
+    rb' (' + b'|'.join(sorted(USI_INFO_MOVE_KEYWORDS | {b'string'})) + rb')(?= |$)'
+)
+
+HAND_ORDER = (
     'R', 'B', 'G', 'S', 'N', 'L', 'P', 
     'r', 'b', 'g', 's', 'n', 'l', 'p'
-]
+)
+
+HAND_INDEX = {piece: i for i, piece in enumerate(HAND_ORDER)}
+
+# Files and ranks swap between digits and letters and are both reversed, 
+# so the same table converts squares in either direction (7g <-> c3) 
+SQUARE_TABLE = bytes.maketrans(b'123456789abcdefghi', b'ihgfedcba987654321')
+
+# Every board square is precomputed so converting one is a single lookup, 
+# this also rejects anything that isn't a square 
+USI_TO_UCI_SQUARES = {
+    square: square.translate(SQUARE_TABLE) 
+    for square in (bytes((col, row)) for col in b'123456789' for row in b'abcdefghi')
+}
 
-def log(msg): 
+UCI_TO_USI_SQUARES = {uci: usi for usi, uci in USI_TO_UCI_SQUARES.items()}
+
+def log(msg: str) -> None: 
     if not DEBUG: return 
     sys.stderr.write(msg + '\n') 
     sys.stderr.flush() 
 
-def base_cmd_replacer(new_cmd): 
-    def replacer(cmd): 
-        cmd[0] = new_cmd 
-        return cmd 
+def base_cmd_replacer(new_cmd: bytes) -> Converter: 
+    def replacer(line: bytes) -> bytes: 
+        _, sep, rest = line.partition(b' ')
+        return new_cmd + sep + rest 
     return replacer
 
-def usi_to_uci_square(square): 
-    col = 8 - (ord(square[0]) - ord('1')) 
-    row = 8 - (ord(square[1]) - ord('a')) 
-    return chr(ord('a') + col) + chr(ord('1') + row)
+def split_replacer(func: Callable[[List[bytes]], List[bytes]]) -> Converter: 
+    # Wraps converters that work on the list of words in a command 
+    def replacer(line: bytes) -> bytes: 
+        return b' '.join(func(line.split(b' ')))
+    return replacer
 
-def usi_to_uci_move(move): 
-    if move == '0000': 
-        return move 
-    try: 
-        sq_from = move[0:2]
-        sq_to = move[2:4]
-        piece = move[0]
-        promote = move[1]
-        if promote == '*': 
-            out = piece 
-            out += '@' 
-            out += usi_to_uci_square(sq_to) 
-            out += move[4:] 
-            move = out 
-        else: # Normal move 
-            out = usi_to_uci_square(sq_from)
-            out += usi_to_uci_square(sq_to)
-            out += move[4:]
-            move = out 
-    except Exception as e: 
-        log("-- Expected move but could not parse: " + move + ": " + str(e) + " --") 
-        pass 
+def move_cache(func: Converter) -> Converter: 
+    # The same PV moves are converted over and over while the engine searches 
+    cache: Dict[bytes, bytes] = {} 
+    def converter(move: bytes) -> bytes: 
+        out = cache.get(move) 
+        if out is None: 
+            out = func(move) 
+            if len(cache) >= MOVE_CACHE_SIZE: 
+                # Start over, the moves still in use come back right away 
+                cache.clear() 
+            cache[move] = out 
+        return out 
+    return converter
+
+def usi_to_uci_square(square: bytes) -> bytes: 
+    return USI_TO_UCI_SQUARES[square]
+
+def uci_to_usi_square(square: bytes) -> bytes: 
+    return UCI_TO_USI_SQUARES[square]
+
+def parse_failed(move: bytes) -> bytes: 
+    log("-- Expected move but could not parse: " + move.decode(errors='replace') + " --") 
     return move 
 
-def uci_to_usi_square(square): 
-    col = 8 - (ord(square[0]) - ord('a')) 
-    row = 8 - (ord(square[1]) - ord('1')) 
-    return chr(ord('1') + col) + chr(ord('a') + row)
+def board_move_converter(squares: Dict[bytes, bytes]) -> Converter: 
+    def converter(move: bytes) -> bytes: 
+        sq_from = squares.get(move[0:2])
+        sq_to = squares.get(move[2:4])
+        if sq_from is None or sq_to is None: 
+            return parse_failed(move) 
+        return sq_from + sq_to + move[4:]
+    return converter
+
+def drop_move_converter(squares: Dict[bytes, bytes], drop: bytes) -> Converter: 
+    def converter(move: bytes) -> bytes: 
+        sq_to = squares.get(move[2:4])
+        if sq_to is None: 
+            return parse_failed(move) 
+        return move[0:1] + drop + sq_to + move[4:]
+    return converter
+
+def move_kind_table(drop: bytes, board_move: Converter, drop_move: Converter) -> Tuple[Converter, ...]: 
+    # Indexed by the second byte of a move, which is the drop marker for drops 
+    return tuple(drop_move if i == drop[0] else board_move for i in range(256))
+
+USI_TO_UCI_MOVES = move_kind_table(
+    b'*', 
+    board_move_converter(USI_TO_UCI_SQUARES), 
+    drop_move_converter(USI_TO_UCI_SQUARES, b'@')
+)
+
+UCI_TO_USI_MOVES = move_kind_table(
+    b'@', 
+    board_move_converter(UCI_TO_USI_SQUARES), 
+    drop_move_converter(UCI_TO_USI_SQUARES, b'*')
+)
+
+@move_cache
+def usi_to_uci_move(move: bytes) -> bytes: 
+    # Anything shorter can't be a move, '0000' (null move) isn't made of 
+    # squares so it is passed through unchanged as well 
+    if len(move) < 4: 
+        return move 
+    return USI_TO_UCI_MOVES[move[1]](move)
 
-def uci_to_usi_move(move): 
-    if move == '0000': 
+@move_cache
+def uci_to_usi_move(move: bytes) -> bytes: 
+    if len(move) < 4: 
         return move 
-    try: 
-        sq_from = move[0:2]
-        sq_to = move[2:4]
-        piece = move[0]
-        promote = move[1]
-        if promote == '@': 
-            out = piece 
-            out += '*' 
-            out += uci_to_usi_square(sq_to) 
-            out += move[4:] 
-            move = out 
-        else: # Normal move 
-            out = uci_to_usi_square(sq_from)
-            out += uci_to_usi_square(sq_to)
-            out += move[4:]
-            move = out 
-    except Exception as e: 
-        log("-- Expected move but could not parse: " + move + ": " + str(e) + " --") 
-        pass 
-    return move 
+    return UCI_TO_USI_MOVES[move[1]](move)
 
-def usi_to_uci_bestmove(cmd): 
+def usi_to_uci_bestmove(cmd: List[bytes]) -> List[bytes]: 
     if len(cmd) < 2: 
         return cmd 
 
     cmd[1] = usi_to_uci_move(cmd[1])
     return cmd 
 
-def usi_to_uci_info(cmd): 
-    convert_move = False 
-    convert_mate = False 
-
-    for i in range(len(cmd)): 
-        term = cmd[i]
-
-        if term in USI_INFO_KEYWORDS: 
-            convert_move = False 
-            convert_mate = False 
-
-        if convert_mate: 
-            log("-- TODO Convert mate from ply to turn --")
-
-        if convert_move: 
-            cmd[i] = usi_to_uci_move(term)
-
-        if term == 'mate': 
-            convert_mate = True 
-        elif term in USI_INFO_MOVE_KEYWORDS: 
-            convert_move = True 
-        elif term == 'string': 
+def usi_to_uci_moves(moves: bytes) -> bytes: 
+    # Only the move list is split, the rest of the line is copied as is 
+    return b' '.join(map(usi_to_uci_move, moves.split(b' ')))
+
+def usi_to_uci_info(line: bytes) -> bytes: 
+    # Known limitation: 'score mate' is passed through in plies, but UCI 
+    # expects moves 
+    first = USI_INFO_MOVE_START_RE.search(line) 
+    if first is None or first.group(1) == b'string': 
+        return line 
+
+    out: List[bytes] = [] 
+    pos = 0 
+    move_start = -1 
+
+    # Only keywords are visited, move lists between them are converted in bulk 
+    for match in USI_INFO_KEYWORD_RE.finditer(line, first.start()): 
+        if move_start >= 0: 
+            out.append(line[pos:move_start])
+            out.append(usi_to_uci_moves(line[move_start:match.start()]))
+            pos = match.start() 
+            move_start = -1 
+
+        term = match.group(1) 
+        if term in USI_INFO_MOVE_KEYWORDS: 
+            move_start = match.end() 
+        elif term == b'string': 
             # Rest of the line is ignored 
             break 
 
-    return cmd 
+    if move_start >= 0: 
+        out.append(line[pos:move_start])
+        out.append(usi_to_uci_moves(line[move_start:]))
+        pos = len(line) 
 
-def usi_to_uci_option(cmd): 
-    if len(cmd) < 3 or cmd[1] != 'name': 
+    out.append(line[pos:])
+    return b''.join(out) 
+
+def usi_to_uci_option(cmd: List[bytes]) -> List[bytes]: 
+    if len(cmd) < 3 or cmd[1] != b'name': 
         return cmd 
 
     cmd[2] = USI_TO_UCI_OPTIONS.get(cmd[2], cmd[2])
 
     # USI added 'filename' type 
-    if len(cmd) >= 5 and cmd[3] == 'type' and cmd[4] == 'filename': 
-        cmd[4] = 'string'
+    if len(cmd) >= 5 and cmd[3] == b'type' and cmd[4] == b'filename': 
+        cmd[4] = b'string'
 
     return cmd
 
-def uci_to_usi_setoption(cmd): 
-    if len(cmd) < 3 or cmd[1] != 'name': 
+def uci_to_usi_setoption(cmd: List[bytes]) -> List[bytes]: 
+    if len(cmd) < 3 or cmd[1] != b'name': 
         return cmd 
 
-    name_mode = True 
-    name = [] 
-    after = [] 
-
     # UCI options can have spaces so get the whole name
-    for term in cmd[2:]: 
-        if term == 'value': 
-            name_mode = False 
-
-        if name_mode: 
-            name.append(term) 
-        else: 
-            after.append(term) 
+    try: 
+        value = cmd.index(b'value', 2) 
+    except ValueError: 
+        value = len(cmd) 
 
     # USI options may not have spaces 
-    name = '_'.join(name) 
+    if value == 3: 
+        name = cmd[2] 
+    else: 
+        name = b'_'.join(cmd[2:value]) 
     name = UCI_TO_USI_OPTIONS.get(name, name)
 
-    return cmd[:2] + [name] + after
+    return cmd[:2] + [name] + cmd[value:]
+
+def hand_sort_key(item: Tuple[str, int]) -> int: 
+    # Unknown pieces sort last and are dropped 
+    return HAND_INDEX.get(item[0], len(HAND_ORDER))
 
-def fen_to_sfen(fen): 
-    cmd = fen.split(' ') 
-    board = cmd[0]
+def fen_to_sfen(fen: str) -> str: 
+    # Only some of the fields are needed so peel them off one at a time 
+    board, _, rest = fen.partition(' ') 
+    turn, _, rest = rest.partition(' ') 
+    _, _, rest = rest.partition(' ') # Castling 
+    short_move_num, _, rest = rest.partition(' ') # Move number if the FEN is shortened 
+    _, _, rest = rest.partition(' ') # Halfmove clock 
+    full_move_num, _, _ = rest.partition(' ') 
     hand = '-'
-    turn = ''
     move_num = '1'
 
     # Separate hand and convert it to SFEN style
     if '[' in board: 
-        board = board.replace(']', '').split('[') 
-        hand_count = collections.defaultdict(int) 
-
-        # FEN hand lists n chars for n pieces (2R4p = RRpppp)
-        for piece in board[1]: 
-            hand_count[piece] += 1
-
-        hand_str = ''
-        for piece in HAND_ORDER: 
-            if hand_count[piece] == 1: 
-                hand_str += piece 
-            elif hand_count[piece] > 1: 
-                hand_str += str(hand_count[piece]) + piece 
+        board, _, hand_part = board.partition('[') 
+
+        # FEN hand lists n chars for n pieces (2R4p = RRpppp), a plain dict 
+        # is used since PyPy's JIT traces it better than Counter 
+        hand_count: Dict[str, int] = {} 
+        for piece in hand_part.rstrip(']'): 
+            hand_count[piece] = hand_count.get(piece, 0) + 1
+
+        # Only the piece types actually in hand are sorted 
+        hand_str = ''.join(
+            (str(count) + piece if count > 1 else piece) 
+            for piece, count in sorted(hand_count.items(), key=hand_sort_key) 
+            if piece in HAND_INDEX
+        )
         if len(hand_str) != 0: 
             hand = hand_str
 
-        board = board[0] 
-
     # Colors are swapped 
-    if len(cmd) >= 2: 
-        turn = cmd[1] 
-        if turn == 'w': 
-            turn = 'b' 
-        elif turn == 'b': 
-            turn = 'w' 
+    if turn == 'w': 
+        turn = 'b' 
+    elif turn == 'b': 
+        turn = 'w' 
 
     # Turn number 
     try: 
-        if len(cmd) >= 4 and cmd[3].isdigit(): # isdigit returns False for '-' which is what we want 
-            move_num = cmd[3] 
-        if len(cmd) >= 6 and cmd[5].isdigit(): # isdigit returns False for '-' which is what we want 
-            move_num = cmd[5] 
-        move_num = int(move_num) * 2 - 1
+        # Prefer the full FEN field, isdigit returns False for '-' which is what we want 
+        for field in (full_move_num, short_move_num): 
+            if field.isdigit(): 
+                move_num = field 
+                break 
+        ply = int(move_num) * 2 - 1
         if turn == 'w': 
-            move_num += 1
-        move_num = str(move_num) 
+            ply += 1
+        move_num = str(ply) 
     except: 
         pass 
 
     return ' '.join([board, turn, hand, move_num])
 
-def uci_to_usi_position(cmd): 
+def fen_to_sfen_bytes(fen: bytes) -> bytes: 
+    # Positions are rare compared to engine output so decoding here is fine 
+    return fen_to_sfen(fen.decode(errors='surrogateescape')).encode(errors='surrogateescape')
+
+def uci_to_usi_position(cmd: List[bytes]) -> List[bytes]: 
     if len(cmd) < 3: 
         return cmd 
 
-    out = ['position']
-    fen = [] 
-    fen_mode = False 
-    move_mode = False 
-
-    for term in cmd[1:]: 
-        if term == 'fen': 
-            fen_mode = True 
-            move_mode = False 
-            out.append('sfen') 
-            continue 
-
-        if term == 'moves': 
-            if len(fen) > 0: 
-                out.append(fen_to_sfen(' '.join(fen)))
-                fen = [] 
-            fen_mode = False 
-            move_mode = True 
-            out.append('moves') 
-            continue 
-
-        if fen_mode: 
-            fen.append(term)
-        elif move_mode: 
-            out.append(uci_to_usi_move(term))
-        else: 
-            out.append(term) 
-
-    # If there were no moves after the FEN then it hasn't been added 
-    if len(fen) > 0: 
-        out.append(fen_to_sfen(' '.join(fen)))
-        fen = [] 
+    # Everything after 'moves' is a move, the move list grows every turn so 
+    # convert it in one go instead of checking each term 
+    try: 
+        moves = cmd.index(b'moves', 1) 
+    except ValueError: 
+        moves = len(cmd) 
+
+    out = [b'position']
+    setup = cmd[1:moves] 
+
+    if b'fen' in setup: 
+        fen = setup.index(b'fen') 
+        out.extend(setup[:fen]) 
+        out.append(b'sfen') 
+        if fen + 1 < len(setup): 
+            out.append(fen_to_sfen_bytes(b' '.join(setup[fen + 1:])))
+    else: 
+        out.extend(setup) 
+
+    if moves < len(cmd): 
+        out.append(b'moves') 
+        out.extend(map(uci_to_usi_move, cmd[moves + 1:]))
 
     return out 
 
+# Bound once so the most common commands can skip the table lookup 
+uci_to_usi_position_line = split_replacer(uci_to_usi_position)
+usi_to_uci_bestmove_line = split_replacer(usi_to_uci_bestmove)
+
 UCI_TO_USI = {
-    'uci': base_cmd_replacer('usi'), 
-    'ucinewgame': base_cmd_replacer('usinewgame'), 
-    'setoption': uci_to_usi_setoption, 
-    'position': uci_to_usi_position, 
+    b'uci': base_cmd_replacer(b'usi'), 
+    b'ucinewgame': base_cmd_replacer(b'usinewgame'), 
+    b'setoption': split_replacer(uci_to_usi_setoption), 
+    b'position': uci_to_usi_position_line, 
 }
 
 USI_TO_UCI = {
-    'usiok': base_cmd_replacer('uciok'), 
-    'bestmove': usi_to_uci_bestmove, 
-    'info': usi_to_uci_info, 
-    'option': usi_to_uci_option, 
+    b'usiok': base_cmd_replacer(b'uciok'), 
+    b'bestmove': usi_to_uci_bestmove_line, 
+    b'info': usi_to_uci_info, 
+    b'option': split_replacer(usi_to_uci_option), 
 }
 
-def usi_to_uci(cmd): 
-    if cmd[0] in USI_TO_UCI: 
-        cmd = USI_TO_UCI[cmd[0]](cmd)
+def usi_to_uci(line: bytes) -> bytes: 
+    # Nearly every line an engine prints is info, check it before anything else 
+    if line.startswith(b'info '): 
+        return usi_to_uci_info(line)
+    if line.startswith(b'bestmove '): 
+        return usi_to_uci_bestmove_line(line)
 
-    return cmd
+    cmd = line.partition(b' ')[0] 
+    if cmd in USI_TO_UCI: 
+        line = USI_TO_UCI[cmd](line)
 
-def uci_to_usi(cmd): 
-    if cmd[0] in UCI_TO_USI: 
-        cmd = UCI_TO_USI[cmd[0]](cmd)
+    return line
 
-    log("-- To engine: " + ' '.join(cmd) + " --")
-    return cmd
+def uci_to_usi(line: bytes) -> bytes: 
+    # Every search is preceded by a position command 
+    if line.startswith(b'position '): 
+        line = uci_to_usi_position_line(line)
+    else: 
+        cmd = line.partition(b' ')[0] 
+        if cmd in UCI_TO_USI: 
+            line = UCI_TO_USI[cmd](line)
+
+    log("-- To engine: " + line.decode(errors='replace') + " --")
+    return line
 
-def process_lines(f_in, f_out): 
+def process_lines(f_in: BinaryIO, f_out: BinaryIO) -> None: 
     try: 
         while not f_in.closed and not f_out.closed: 
             try: 
-                line = f_in.readline().decode()
+                line = f_in.readline()
             except: 
                 break 
 
             if len(line) == 0: 
                 break 
 
-            words = line.rstrip().split(' ')
-            out = ' '.join(usi_to_uci(words)) + '\n'
-            f_out.write(out.encode())
+            f_out.write(usi_to_uci(line.rstrip(b'\r\n')) + b'\n')
             f_out.flush()
     except: 
         pass 
     os.kill(os.getpid(), signal.SIGINT); 
 
-def main_cli(): 
-    sys.stdout.reconfigure(line_buffering=True)
+def convert_lines(data: bytes, convert: Converter, out: bytearray) -> bytes: 
+    # Drop Windows line endings for the whole chunk at once 
+    if b'\r' in data: 
+        data = data.replace(b'\r\n', b'\n') 
+
+    lines = data.split(b'\n') 
+
+    # The last piece is an incomplete line (or empty) and waits for more data 
+    rest = lines.pop() 
+    if len(lines) == 0: 
+        return rest 
+
+    # Lines that arrived together are queued together, the output is built 
+    # with one join so its size is known before anything is copied 
+    out += b'\n'.join(map(convert, lines))
+    out += b'\n' 
+
+    return rest 
+
+def writable(fd: int) -> bool: 
+    return len(select.select([], [fd], [], 0)[1]) != 0
+
+class Relay: 
+    # One direction of the wrapper: lines read from src_fd are converted and 
+    # queued in pending until dst_fd can take them. If write_size is set then 
+    # dst_fd is blocking and writes are limited to that size 
+    def __init__(self, src_fd: int, dst_fd: int, convert: Converter, write_size: int = 0) -> None: 
+        self.src_fd = src_fd 
+        self.dst_fd = dst_fd 
+        self.convert = convert 
+        self.write_size = write_size 
+        self.rest = b'' 
+        self.pending = bytearray() 
+        self.eof = False 
+
+    def events(self, fd: int) -> int: 
+        if fd == self.src_fd: 
+            # Stop reading while the other side is behind so memory stays bounded 
+            if not self.eof and len(self.pending) < BUFFER_SIZE: 
+                return selectors.EVENT_READ 
+            return 0 
+        if len(self.pending) != 0: 
+            return selectors.EVENT_WRITE 
+        return 0 
+
+    def read(self) -> None: 
+        # A ready pipe never blocks on read 
+        data = os.read(self.src_fd, BUFFER_SIZE) 
+        if len(data) != 0: 
+            self.rest = convert_lines(self.rest + data, self.convert, self.pending)
+        else: 
+            # End of stream, a final line may not have a newline 
+            if len(self.rest) != 0: 
+                convert_lines(self.rest + b'\n', self.convert, self.pending)
+                self.rest = b'' 
+            self.eof = True 
+
+        # Most of the time the destination can take it right away 
+        self.write() 
+
+    def write(self) -> None: 
+        while len(self.pending) != 0: 
+            if self.write_size != 0: 
+                # Once select() reports room, a write of up to PIPE_BUF bytes 
+                # can't block 
+                if not writable(self.dst_fd): 
+                    return 
+                data = self.pending[:self.write_size] 
+            else: 
+                data = self.pending 
 
-    parser = argparse.ArgumentParser()
-    parser.add_argument('engine', type=str, help="The engine command")
-    parser.add_argument('args', nargs='*', type=str, default=[], help="Arguments to pass to the engine")
-    args = parser.parse_args()
+            try: 
+                # Short writes are fine, the remainder waits for EVENT_WRITE 
+                written = os.write(self.dst_fd, data) 
+            except BlockingIOError: 
+                return 
+            except BrokenPipeError: 
+                # Nobody is listening anymore so stop relaying this direction 
+                self.pending.clear() 
+                self.eof = True 
+                return 
+            del self.pending[:written] 
+
+def watch(sel: selectors.BaseSelector, fd: int, events: int, relay: Relay) -> None: 
+    try: 
+        key: Optional[selectors.SelectorKey] = sel.get_key(fd) 
+    except KeyError: 
+        key = None 
+
+    if key is None: 
+        if events != 0: 
+            sel.register(fd, events, relay) 
+    elif events == 0: 
+        sel.unregister(fd) 
+    elif key.events != events: 
+        sel.modify(fd, events, relay) 
+
+def select_lines(proc: 'subprocess.Popen[bytes]') -> None: 
+    # Both directions are handled in this thread so there is no GIL contention. 
+    # Only four pipes are watched so select() is enough, and unlike epoll it 
+    # also accepts stdin redirected from a file 
+    assert proc.stdin is not None and proc.stdout is not None 
+    to_engine = Relay(sys.stdin.fileno(), proc.stdin.fileno(), uci_to_usi) 
+    to_gui = Relay(proc.stdout.fileno(), sys.stdout.fileno(), usi_to_uci, select.PIPE_BUF) 
+    relays = (to_engine, to_gui) 
+    engine_stdin_open = True 
+
+    # Writes must never block, otherwise a side that stops reading could stall 
+    # the other direction too and both processes would wait on each other. 
+    # Only our end of the engine's stdin pipe is made non-blocking. The flag 
+    # belongs to the open file, and stdout can be shared with the engine's 
+    # stderr or the terminal, so it is left alone 
+    sys.stdout.flush() 
+    os.set_blocking(to_engine.dst_fd, False) 
+
+    sel = selectors.SelectSelector() 
+    try: 
+        while not (to_gui.eof and len(to_gui.pending) == 0): 
+            if engine_stdin_open and to_engine.eof and len(to_engine.pending) == 0: 
+                # Let the engine know there is no more input 
+                watch(sel, to_engine.dst_fd, 0, to_engine) 
+                proc.stdin.close() 
+                engine_stdin_open = False 
+
+            for relay in relays: 
+                watch(sel, relay.src_fd, relay.events(relay.src_fd), relay) 
+                if relay is not to_engine or engine_stdin_open: 
+                    watch(sel, relay.dst_fd, relay.events(relay.dst_fd), relay) 
+
+            for key, _ in sel.select(): 
+                relay = key.data 
+                if key.fd == relay.src_fd: 
+                    relay.read() 
+                else: 
+                    relay.write() 
+    except: 
+        pass 
 
-    cmd = [args.engine, *args.args]
-    log(f"-- Running command {' '.join(cmd)} --") 
+    sel.close() 
 
-    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stdin=subprocess.PIPE)
+def thread_lines(proc: 'subprocess.Popen[bytes]') -> None: 
+    assert proc.stdin is not None and proc.stdout is not None 
     t_out = threading.Thread(
         target=process_lines, 
         args=(proc.stdout, sys.stdout.buffer), 
@@ -345,14 +553,15 @@ def main_cli():
     )
     t_out.start()
 
+    # Protocol text is ASCII so read raw bytes and skip the text layer 
+    f_in = io.open(sys.stdin.fileno(), 'rb', buffering=BUFFER_SIZE, closefd=False)
+
     try: 
         while True: 
-            line = sys.stdin.readline() 
+            line = f_in.readline() 
             if len(line) == 0: 
                 break 
-            words = line.rstrip().split(' ')
-            out = ' '.join(uci_to_usi(words)) + '\n' 
-            proc.stdin.write(out.encode()) 
+            proc.stdin.write(uci_to_usi(line.rstrip(b'\r\n')) + b'\n') 
             proc.stdin.flush()
     except: 
         pass 
@@ -362,6 +571,22 @@ def main_cli():
     except: 
         pass 
 
+def main_cli() -> None: 
+    parser = argparse.ArgumentParser()
+    parser.add_argument('engine', type=str, help="The engine command")
+    parser.add_argument('args', nargs='*', type=str, default=[], help="Arguments to pass to the engine")
+    args = parser.parse_args()
+
+    cmd = [args.engine, *args.args]
+    log(f"-- Running command {' '.join(cmd)} --") 
+
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stdin=subprocess.PIPE, bufsize=BUFFER_SIZE)
+
+    # Windows can only select() on sockets so a reader thread is used there 
+    if os.name == 'nt': 
+        thread_lines(proc) 
+    else: 
+        select_lines(proc) 
+
 if __name__ == '__main__': 
     main_cli() 
-
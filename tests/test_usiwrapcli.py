@@ -0,0 +1,258 @@
+import os 
+import select
+import signal
+import subprocess
+import sys 
+import tempfile
+import textwrap
+import unittest
+
+from shogiutil.usiwrapcli import uci_to_usi, uci_to_usi_position, usi_to_uci
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 'python -m' doesn't work when the module is compiled with mypyc 
+MAIN_CLI = 'from shogiutil.usiwrapcli import main_cli; main_cli()'
+
+# Prints a lot of info before it starts reading, so both pipes fill up at once 
+STALLING_ENGINE = textwrap.dedent('''
+    import sys, time
+    time.sleep(0.5)
+    for i in range(20000): 
+        sys.stdout.write('info depth %d pv 7g7f 3c3d\\n' % i)
+    sys.stdout.flush()
+    n = 0
+    for line in sys.stdin: 
+        n += 1
+        if n == 3001: 
+            break
+    print('read %d' % n, flush=True)
+''')
+
+# Reports on the terminal it shares with usiwrap, then waits until usiwrap is gone 
+TERMINAL_ENGINE = textwrap.dedent('''
+    import os, sys, time
+    time.sleep(0.5)
+    sys.stderr.write('stderr blocking %s\\n' % os.get_blocking(2))
+    sys.stderr.flush()
+    if sys.argv[1] == 'wait': 
+        sys.stdin.read()
+''')
+
+def read_terminal(fd, until, timeout=10): 
+    out = b''
+    while until not in out: 
+        ready, _, _ = select.select([fd], [], [], timeout)
+        if len(ready) == 0: 
+            break
+        try: 
+            data = os.read(fd, 1 << 16)
+        except OSError: 
+            # EIO once everyone closed the slave 
+            break
+        if len(data) == 0: 
+            break
+        out += data
+    return out
+
+START = b'lnsgkgsnl/1r5b1/ppppppppp/9/9/9/PPPPPPPPP/1B5R1/LNSGKGSNL'
+
+class TestUsiToUci(unittest.TestCase): 
+    def test_info_moves_before_other_keywords(self): 
+        self.assertEqual(
+            usi_to_uci(b'info depth 3 pv 7g7f 3c3d score cp 10 nodes 5'), 
+            b'info depth 3 pv c3c4 g7g6 score cp 10 nodes 5'
+        )
+
+    def test_info_moves_after_other_keywords(self): 
+        self.assertEqual(
+            usi_to_uci(b'info score cp 10 pv 7g7f 3c3d'), 
+            b'info score cp 10 pv c3c4 g7g6'
+        )
+
+    def test_info_refutation_and_currline(self): 
+        self.assertEqual(
+            usi_to_uci(b'info refutation 7g7f 3c3d currline 2g2f 8c8d'), 
+            b'info refutation c3c4 g7g6 currline h3h4 b7b6'
+        )
+
+    def test_info_currmove_then_currmovenumber(self): 
+        self.assertEqual(
+            usi_to_uci(b'info currmove 7g7f currmovenumber 1'), 
+            b'info currmove c3c4 currmovenumber 1'
+        )
+
+    def test_info_string_before_moves(self): 
+        self.assertEqual(usi_to_uci(b'info string pv 7g7f'), b'info string pv 7g7f')
+
+    def test_info_string_after_moves(self): 
+        self.assertEqual(
+            usi_to_uci(b'info pv 7g7f string pv 7g7f'), 
+            b'info pv c3c4 string pv 7g7f'
+        )
+
+    def test_drop_and_promotion(self): 
+        self.assertEqual(usi_to_uci(b'info pv P*5e 8h2b+'), b'info pv P@e5 b2h8+')
+
+    def test_bestmove(self): 
+        self.assertEqual(
+            usi_to_uci(b'bestmove 8h2b+ ponder 3a2b'), 
+            b'bestmove b2h8+ ponder 3a2b'
+        )
+
+    def test_bestmove_null_and_resign(self): 
+        self.assertEqual(usi_to_uci(b'bestmove 0000'), b'bestmove 0000')
+        self.assertEqual(usi_to_uci(b'bestmove resign'), b'bestmove resign')
+
+    def test_option(self): 
+        self.assertEqual(
+            usi_to_uci(b'option name USI_Hash type spin default 16'), 
+            b'option name Hash type spin default 16'
+        )
+        self.assertEqual(
+            usi_to_uci(b'option name BookFile type filename default book.bin'), 
+            b'option name BookFile type string default book.bin'
+        )
+
+    def test_usiok(self): 
+        self.assertEqual(usi_to_uci(b'usiok'), b'uciok')
+
+class TestUciToUsi(unittest.TestCase): 
+    def test_uci(self): 
+        self.assertEqual(uci_to_usi(b'uci'), b'usi')
+
+    def test_moves(self): 
+        self.assertEqual(
+            uci_to_usi(b'position startpos moves c3c4 P@e5 h2b8+'), 
+            b'position startpos moves 7g7f P*5e 2h8b+'
+        )
+
+    def test_null_move(self): 
+        self.assertEqual(
+            uci_to_usi(b'position startpos moves 0000'), 
+            b'position startpos moves 0000'
+        )
+
+    def test_setoption_multi_word_name(self): 
+        self.assertEqual(
+            uci_to_usi(b'setoption name Skill Level value 3'), 
+            b'setoption name Skill_Level value 3'
+        )
+        self.assertEqual(
+            uci_to_usi(b'setoption name Hash value 64'), 
+            b'setoption name USI_Hash value 64'
+        )
+
+    def test_fen_with_hand(self): 
+        self.assertEqual(
+            uci_to_usi(b'position fen ' + START + b'[RBppP] b - - 0 1'), 
+            b'position sfen ' + START + b' w RBP2p 2'
+        )
+
+    def test_fen_short_move_fields(self): 
+        self.assertEqual(
+            uci_to_usi(b'position fen ' + START + b'[] w 1 moves c3c4'), 
+            b'position sfen ' + START + b' b - 1 moves 7g7f'
+        )
+
+class TestUciToUsiPosition(unittest.TestCase): 
+    def convert(self, cmd): 
+        return b' '.join(uci_to_usi_position(cmd.split(b' ')))
+
+    def test_startpos(self): 
+        self.assertEqual(self.convert(b'position startpos'), b'position startpos')
+
+    def test_startpos_empty_moves(self): 
+        self.assertEqual(self.convert(b'position startpos moves'), b'position startpos moves')
+
+    def test_fen(self): 
+        self.assertEqual(
+            self.convert(b'position fen ' + START + b'[] w - - 0 1'), 
+            b'position sfen ' + START + b' b - 1'
+        )
+
+    def test_fen_moves(self): 
+        self.assertEqual(
+            self.convert(b'position fen ' + START + b'[Pp] w - - 0 1 moves c3c4 g7g6'), 
+            b'position sfen ' + START + b' b Pp 1 moves 7g7f 3c3d'
+        )
+
+    def test_fen_empty_moves(self): 
+        self.assertEqual(
+            self.convert(b'position fen ' + START + b'[] w - - 0 1 moves'), 
+            b'position sfen ' + START + b' b - 1 moves'
+        )
+
+    def test_fen_without_position(self): 
+        self.assertEqual(self.convert(b'position fen moves c3c4'), b'position sfen moves 7g7f')
+
+@unittest.skipIf(os.name == 'nt', "Windows uses the threaded relay")
+class TestSelectLines(unittest.TestCase): 
+    def test_full_pipes_do_not_deadlock(self): 
+        with tempfile.TemporaryDirectory() as tmp: 
+            engine = os.path.join(tmp, 'engine.py')
+            with open(engine, 'w') as f: 
+                f.write(STALLING_ENGINE)
+
+            position = b'position startpos moves ' + b' '.join([b'c3c4 g7g6'] * 6) + b'\n'
+            proc = subprocess.Popen(
+                [sys.executable, '-c', MAIN_CLI, sys.executable, engine], 
+                stdin=subprocess.PIPE, 
+                stdout=subprocess.PIPE, 
+                cwd=ROOT
+            )
+            try: 
+                out, _ = proc.communicate(position * 3001, timeout=30)
+            except subprocess.TimeoutExpired: 
+                proc.kill() 
+                proc.communicate() 
+                self.fail("usiwrap stopped relaying with both pipes full")
+
+        lines = out.splitlines() 
+        self.assertEqual(len(lines), 20001)
+        self.assertEqual(lines[0], b'info depth 0 pv c3c4 g7g6')
+        self.assertEqual(lines[-1], b'read 3001')
+        self.assertEqual(proc.returncode, 0)
+
+    def run_on_terminal(self, mode): 
+        import pty
+        master, slave = pty.openpty() 
+        try: 
+            with tempfile.TemporaryDirectory() as tmp: 
+                engine = os.path.join(tmp, 'engine.py')
+                with open(engine, 'w') as f: 
+                    f.write(TERMINAL_ENGINE)
+
+                proc = subprocess.Popen(
+                    [sys.executable, '-c', MAIN_CLI, sys.executable, engine, mode], 
+                    stdin=subprocess.PIPE, 
+                    stdout=slave, 
+                    stderr=slave, 
+                    cwd=ROOT
+                )
+                try: 
+                    out = read_terminal(master, b'\n')
+                    if mode == 'wait': 
+                        proc.send_signal(signal.SIGTERM)
+                    proc.stdin.close() 
+                    proc.wait(timeout=10)
+                finally: 
+                    if proc.poll() is None: 
+                        proc.kill() 
+                        proc.wait() 
+
+            # The terminal is shared with the engine and whoever started usiwrap 
+            self.assertIn(b'stderr blocking True', out)
+            self.assertTrue(os.get_blocking(slave))
+        finally: 
+            os.close(master)
+            os.close(slave)
+
+    def test_terminal_stays_blocking(self): 
+        self.run_on_terminal('exit')
+
+    def test_terminal_stays_blocking_after_sigterm(self): 
+        self.run_on_terminal('wait')
+
+if __name__ == '__main__': 
+    unittest.main()